@@ -1,29 +1,55 @@
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
 import subprocess
+import sys
+from typing import Optional, Tuple
+from .cache import cache_key, get_cached_response, set_cached_response
+from .openai_client import get_api_key, get_client, get_model
+from .utils import GIT, git_read_env, prune_diff, read_capped, split_diff_by_file
 
-def get_git_diff():
-    """Get the staged changes diff"""
-    try:
-        result = subprocess.run(
-            ["git", "diff", "--staged"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        print(f"Error getting git diff: {e}")
-        return None
+# Diffs touching a single file with at most this many changed lines get a local message
+LOCAL_MESSAGE_MAX_LINES = 3
+# A single line of at most 50 characters fits comfortably in this many tokens
+COMMIT_MAX_TOKENS = 32
+
+SYSTEM_PROMPT_COMMIT = """You are a highly knowledgeable assistant specialized 
+in software development and version control systems."""
+
+# The user prompt is this prefix followed by the diff
+USER_PROMPT_COMMIT_PREFIX = """The following Git diff input is in Unified Diff format, 
+which displays changes made to files in a version control system. 
+Analyze the changes and generate a clear, concise commit message that summarizes the main modifications. 
+Focus on describing the purpose or function of the changes. 
+Generate a concise commit message following conventional commits format.
+Requirements:
+- Single line
+- Max 50 characters
+
+Git diff:
+"""
+
+def get_git_diff() -> Tuple[Optional[str], bool]:
+    """
+    Get the staged changes diff.
+    
+    Returns:
+        Tuple[Optional[str], bool]: The diff (None on error), and whether it was cut at MAX_DIFF_BYTES
+    """
+    result = read_capped([GIT, "diff", "--staged"], env=git_read_env())
+    if result.returncode != 0:
+        print(f"Error getting git diff: {result.stderr.strip()}")
+        return None, False
+    return result.stdout, result.truncated
 
 def handle_ai_commit():
-    diff_text = get_git_diff()
+    diff_text, truncated = get_git_diff()
     if not diff_text:
         print("No staged changes found.")
         return 1
     
-    commit_message = generate_commit_message(diff_text)
+    # Trivial changes don't need a round-trip to the API. A truncated diff may hide
+    # other files, so it never counts as trivial.
+    local_message = None if truncated else try_local_commit_message(diff_text)
+    commit_message = local_message or generate_commit_message(diff_text)
     if not commit_message:
         return 1
     
@@ -47,50 +73,111 @@ def handle_ai_commit():
             print("Please answer 'y' (yes), 'n' (no), or 'e' (edit)")
     
     try:
-        subprocess.run(["git", "commit", "-m", commit_message], check=True)
+        subprocess.run([GIT, "commit", "-m", commit_message], check=True)
         return 0
     except subprocess.CalledProcessError as e:
         print(f"Error creating commit: {e}")
         return e.returncode
 
+def try_local_commit_message(diff_text: str) -> Optional[str]:
+    """
+    Build a commit message locally for trivial diffs.
+    
+    Handles a single pure rename, or a single file with at most
+    LOCAL_MESSAGE_MAX_LINES added/removed lines.
+    
+    Returns:
+        Optional[str]: Conventional commit message, or None if the API should be used
+    """
+    file_diffs = split_diff_by_file(diff_text)
+    if len(file_diffs) != 1:
+        return None
+    
+    lines = file_diffs[0].splitlines()
+    rename_from = rename_to = None
+    exact_rename = is_new = is_deleted = False
+    in_hunk = False
+    changed_lines = 0
+    for line in lines[1:]:
+        if line.startswith('@@'):
+            in_hunk = True
+        elif in_hunk:
+            if line.startswith(('+', '-')):
+                changed_lines += 1
+        elif line == 'similarity index 100%':
+            exact_rename = True
+        elif line.startswith('rename from '):
+            rename_from = line[len('rename from '):]
+        elif line.startswith('rename to '):
+            rename_to = line[len('rename to '):]
+        elif line.startswith('new file mode'):
+            is_new = True
+        elif line.startswith('deleted file mode'):
+            is_deleted = True
+    
+    if exact_rename and rename_from and rename_to:
+        return f"refactor: rename {rename_from} to {rename_to}"
+    
+    if changed_lines == 0 or changed_lines > LOCAL_MESSAGE_MAX_LINES:
+        return None
+    
+    file_path = lines[0].split(' b/', 1)[-1]
+    file_name = os.path.basename(file_path)
+    if is_new:
+        return f"chore: add {file_name}"
+    if is_deleted:
+        return f"chore: remove {file_name}"
+    return f"chore: update {file_name}"
+
 def generate_commit_message(diff_text):
     """Generate commit message using OpenAI API"""
-    load_dotenv(override=True)
-
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
+    if not get_api_key():
         print("Error: OPENAI_API_KEY not found in environment variables. Please set it in .env file.")
         return None
     
-    client = OpenAI(api_key=api_key)
+    client = get_client()
     
-    user_prompt = f"""The following Git diff input is in Unified Diff format, 
-    which displays changes made to files in a version control system. 
-    Analyze the changes and generate a clear, concise commit message that summarizes the main modifications. 
-    Focus on describing the purpose or function of the changes. 
-    Generate a concise commit message following conventional commits format.
-    Requirements:
-    - Single line
-    - Max 50 characters
+    diff_text = prune_diff(diff_text)
     
-    Git diff:
-    {diff_text}
-    """
+    user_prompt = USER_PROMPT_COMMIT_PREFIX + diff_text
     
-    system_prompt = """You are a highly knowledgeable assistant specialized 
-    in software development and version control systems.""" 
+    model = get_model()
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT_COMMIT},
+        {"role": "user", "content": user_prompt}
+    ]
+    
+    request = {
+        "model": model,
+        "messages": messages,
+        "temperature": 0,
+        "max_tokens": COMMIT_MAX_TOKENS
+    }
+    # temperature=0 makes the output deterministic, so an identical request can reuse the last answer
+    key = cache_key(request)
+    cached = get_cached_response(key)
+    if cached is not None:
+        sys.stderr.write(cached + "\n")
+        return cached
     
     try:
-        response = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),  # Default to gpt-4o-mini if not specified
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0
-        )
+        response = client.chat.completions.create(**request, stream=True)
+
+        # Echo tokens to stderr as they arrive so the user sees progress right away
+        chunks = []
+        for chunk in response:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                chunks.append(delta)
+                sys.stderr.write(delta)
+                sys.stderr.flush()
+        sys.stderr.write("\n")
 
-        return response.choices[0].message.content.strip()
+        commit_message = "".join(chunks).strip()
+        set_cached_response(key, commit_message)
+        return commit_message
     except Exception as e:
         print(f"Error generating commit message: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -1,201 +1,437 @@
+import asyncio
+import shlex
 import subprocess
-from typing import Tuple
-from openai import OpenAI
-from dotenv import load_dotenv
+import sys
+import tempfile
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from openai import AsyncOpenAI
+from .cache import cache_key, get_cached_response, set_cached_response
 from .github_wrapper import create_pull_request, check_gh_auth
 import os
-from pydantic import BaseModel
-import json
 import re
 from .linear_client import LinearClient
+from .openai_client import get_api_key, get_async_client, get_model
+from .utils import (GIT, MAX_PROMPT_DIFF_BYTES, git_read_env, prompt_choice, prune_diff, run_git,
+                    skip_noise_files, split_diff_by_file, truncate_bytes)
 
 """
 AI-powered Pull Request creation module.
 Handles generating and submitting pull requests using OpenAI for content generation.
 """
-class PRContent(BaseModel):
-    title: str
-    body: str
 
-def get_branch_changes(base_branch: str = None) -> Tuple[str, str]:
+# Diffs larger than this many bytes are summarized in chunks before generating the PR body
+MAP_REDUCE_THRESHOLD = 64 * 1024
+# Diff budget of one summary request: consecutive file diffs are packed up to this size,
+# and only a single file larger than this is cut
+FILE_DIFF_BYTE_BUDGET = 12 * 1024
+# Maximum number of concurrent chunk summary requests
+MAX_CONCURRENT_SUMMARIES = 8
+# Changed lines kept per hunk, the rest of a long hunk adds tokens but little signal
+HUNK_MAX_LINES = 20
+
+# Prompts are built by concatenating these static parts with the dynamic content
+SYSTEM_PROMPT_TITLE = """You are a helpful assistant specialized in writing clear 
+and informative pull request titles."""
+
+USER_PROMPT_TITLE_PREFIX = """Based on the following commit messages and changed files, generate a concise pull request title.
+Respond with the title only, on a single line, without quotes.
+
+Commits:
+"""
+
+SYSTEM_PROMPT_BODY = """You are a helpful assistant specialized in creating clear 
+and informative pull request descriptions."""
+
+USER_PROMPT_BODY_PREFIX = """Based on the following changes and commit messages, generate a detailed pull request body.
+Respond with the body only, without a title.
+The body should include:
+- A summary of changes
+- Key modifications
+- Any important notes
+
+Commits:
+"""
+
+SYSTEM_PROMPT_SUMMARY = """You are a highly knowledgeable assistant specialized 
+in software development and version control systems."""
+
+USER_PROMPT_SUMMARY_PREFIX = """Summarize the following git diff in a few bullet points per file, starting each file with its path.
+Focus on what changed and why it matters, not on line-by-line details.
+
+Diff:
+"""
+
+# TODO comments on added/removed diff lines, e.g. "+    # TODO(context): message". Used with match():
+# the lines start with +/- and .*? can reach any comment, so searching from later offsets never finds more
+_TODO_RE = re.compile(r'[+-].*?(?:#|//|/\*)\s*TODO\s*(?:\(([^)]*)\))?\s*:\s*(.+?)(?:\s*\*/)?\s*$')
+# Lines process_todos needs from a diff: '+++ b/<file>' headers, and added/removed lines mentioning TODO
+_DIFF_SCAN_RE = re.compile(r'^(?:\+\+\+ (?:b/)?(?P<file>[^\n]*)|(?P<todo>[+-][^\n]*TODO[^\n]*))$', re.MULTILINE)
+_ISSUE_ID_RE = re.compile(r'^[A-Z]{2,}-\d+$')
+_INDENT_RE = re.compile(r'^\+\s*')
+
+class BranchInfo(NamedTuple):
+    current_branch: str            # 'HEAD' when detached
+    default_branch: Optional[str]  # None if it can't be determined
+    remote_exists: bool            # origin/<current_branch> is known locally
+    pushed: bool                   # local branch and origin/<current_branch> point at the same commit
+
+def _git_batch(base_branch: Optional[str] = None) -> Optional[BranchInfo]:
+    """
+    Resolve the current branch, the remote default branch and the state of the
+    remote branch with a single git call, reading the local remote-tracking refs.
+    
+    Args:
+        base_branch: Base branch given by the user, the default branch isn't looked up then
+    
+    Returns:
+        Optional[BranchInfo]: Branch information, None if git fails
+    """
+    # %(HEAD) marks the checked out branch and %(symref) resolves origin/HEAD
+    result = run_git(
+        "for-each-ref", "--format=%(HEAD)%00%(refname)%00%(symref)%00%(objectname)",
+        "refs/heads", "refs/remotes/origin"
+    )
+    if result.returncode != 0:
+        _print_git_error(result.stderr)
+        return None
+    
+    current_branch = 'HEAD'
+    current_sha = None
+    default_branch = None
+    remote_branches = {}
+    for line in result.stdout.splitlines():
+        head_marker, refname, symref, sha = line.split('\0')
+        if head_marker == '*':
+            current_branch = refname[len('refs/heads/'):]
+            current_sha = sha
+        elif refname == 'refs/remotes/origin/HEAD':
+            if symref:
+                default_branch = symref[len('refs/remotes/origin/'):]
+        elif refname.startswith('refs/remotes/origin/'):
+            remote_branches[refname[len('refs/remotes/origin/'):]] = sha
+    
+    if base_branch:
+        default_branch = base_branch
+    if not default_branch:
+        # origin/HEAD is only set by clone (or --refresh), fall back to common default branch names
+        default_branch = next((b for b in ['main', 'master'] if b in remote_branches), None)
+    
+    remote_sha = remote_branches.get(current_branch)
+    return BranchInfo(
+        current_branch=current_branch,
+        default_branch=default_branch,
+        remote_exists=remote_sha is not None,
+        pushed=remote_sha is not None and remote_sha == current_sha
+    )
+
+def _print_git_error(stderr: str):
+    """Print a failed git command's error with hints on the usual causes."""
+    print(f"Error getting branch changes: {stderr.strip()}")
+    print("Make sure you:")
+    print("1. Are in a git repository")
+    print("2. Have a remote named 'origin' or 'main'")
+    print("3. Have pushed your changes")
+
+def _iter_proc_lines(proc: subprocess.Popen, cmd: List[str]) -> Iterator[str]:
+    """
+    Yield a running process's stdout line by line as git produces it.
+    
+    Raises:
+        subprocess.CalledProcessError: After the last line, if the process failed
+    """
+    with proc:
+        yield from proc.stdout
+        stderr = proc.stderr.read()
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, None, stderr)
+
+def get_branch_changes(base_branch: str = None, refresh: bool = False) -> Tuple[Iterable[str], str]:
     """
     Get the diff and commit messages between current branch and base branch.
     
+    The diff is not buffered: it is returned as an iterator over the lines of a
+    running 'git diff', so the caller can start scanning while git is still writing.
+    
     Args:
         base_branch: Target base branch. If None, uses default branch.
+        refresh: Fetch from origin first instead of trusting the local remote-tracking refs.
     
     Returns:
-        Tuple[str, str]: (diff content, commit messages)
+        Tuple[Iterable[str], str]: (diff lines including line endings, commit messages)
+        Empty commit messages mean there is nothing to create a PR from.
     """
-    try:
-        print("Getting branch changes...")
-        
-        # Get current branch name
-        current_branch = subprocess.run(
-            ["git", "rev-parse", "--abbrev-ref", "HEAD"],
-            capture_output=True,
-            text=True,
-            check=True
-        ).stdout.strip()
-        print(f"Current branch: {current_branch}")
+    print("Getting branch changes...")
+    
+    if refresh:
+        # The remote branch checks below only read local refs, so update them from the remote first
+        print("Fetching from origin...")
+        result = subprocess.run([GIT, "fetch", "--prune", "origin"], capture_output=True, text=True)
+        if result.returncode != 0:
+            _print_git_error(result.stderr)
+            return "", ""
+        if not base_branch:
+            # Re-detect the default branch and store it as origin/HEAD, where _git_batch reads it
+            result = subprocess.run([GIT, "remote", "set-head", "origin", "--auto"], capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"⚠️ Could not detect origin's default branch: {result.stderr.strip()}")
+    
+    # Resolve current branch, default branch and remote branch state up front in one git call
+    branch_info = _git_batch(base_branch)
+    if branch_info is None:
+        return "", ""
+    current_branch = branch_info.current_branch
+    print(f"Current branch: {current_branch}")
+    
+    # Check if remote branch exists, from the local remote-tracking refs
+    if branch_info.remote_exists:
+        print(f"\nRemote branch 'origin/{current_branch}' exists.")
         
-        # Check if remote branch exists
-        remote_exists = subprocess.run(
-            ["git", "ls-remote", "--heads", "origin", current_branch],
-            capture_output=True,
-            text=True,
-            check=True
-        ).stdout.strip()
+        if not branch_info.pushed:
+            print(f"Local branch '{current_branch}' differs from 'origin/{current_branch}'.")
         
-        if remote_exists:
-            print(f"\nRemote branch 'origin/{current_branch}' exists.")
-            
-            unpushed = subprocess.run(
-                ["git", "log", f"origin/{current_branch}..{current_branch}", "--oneline"],
-                capture_output=True,
-                text=True,
-                check=True
-            ).stdout.strip()
-            
-            if unpushed:
-                print("You have unpushed commits.")
+        while True:
+            response = prompt_choice(
+                f"\033[1;33mWould you like to:\n"
+                f"1. Use/Push to existing remote branch 'origin/{current_branch}'\n"
+                f"2. Create a new remote branch\n"
+                f"Choose (1/2): \033[0m",
+                ('1', '2'),
+                "Please choose 1 or 2"
+            )
             
-            while True:
-                response = input(f"\033[1;33mWould you like to:\n"
-                              f"1. Use/Push to existing remote branch 'origin/{current_branch}'\n"
-                              f"2. Create a new remote branch\n"
-                              f"Choose (1/2): \033[0m").strip()
+            if response == '1':
+                unpushed = ""
+                if not branch_info.pushed:
+                    # Only needed to decide whether to push, and the first unpushed commit is enough
+                    result = run_git("rev-list", "-n", "1", f"origin/{current_branch}..{current_branch}")
+                    if result.returncode != 0:
+                        _print_git_error(result.stderr)
+                        return "", ""
+                    unpushed = result.stdout.strip()
                 
-                if response == '1':
-                    if unpushed:
-                        try:
-                            subprocess.run(
-                                ["git", "push", "origin", current_branch],
-                                check=True
-                            )
-                            print(f"✅ Changes pushed to origin/{current_branch}")
-                        except subprocess.CalledProcessError as e:
-                            print(f"❌ Failed to push changes: {e}")
-                            return "", ""
-                    else:
-                        print(f"✅ Using existing remote branch: origin/{current_branch}")
-                    break
-                elif response == '2':
-                    new_branch_name = input("\033[1;32mEnter new remote branch name: \033[0m").strip()
-                    if not new_branch_name:
-                        print("Branch name cannot be empty")
-                        continue
-                    
-                    try:
-                        subprocess.run(
-                            ["git", "push", "-u", "origin", f"{current_branch}:{new_branch_name}"],
-                            check=True
-                        )
-                        print(f"✅ Created and pushed to remote branch: origin/{new_branch_name}")
-                        current_branch = new_branch_name
-                        break
-                    except subprocess.CalledProcessError as e:
-                        print(f"❌ Failed to create remote branch: {e}")
+                if unpushed:
+                    push = subprocess.run([GIT, "push", "origin", current_branch])
+                    if push.returncode != 0:
+                        print(f"❌ Failed to push changes (exit code {push.returncode})")
                         return "", ""
+                    print(f"✅ Changes pushed to origin/{current_branch}")
                 else:
-                    print("Please choose 1 or 2")
-        else:
-            print(f"\nRemote branch 'origin/{current_branch}' doesn't exist.")
-            while True:
-                response = input(f"\033[1;33mWould you like to create a remote branch? (y/n): \033[0m").lower()
-                if response == 'y':
-                    new_branch_name = input("\033[1;32mEnter remote branch name (press Enter to use current branch name): \033[0m").strip()
-                    remote_branch = new_branch_name if new_branch_name else current_branch
-                    
-                    try:
-                        subprocess.run(
-                            ["git", "push", "-u", "origin", f"{current_branch}:{remote_branch}"],
-                            check=True
-                        )
-                        print(f"✅ Created and pushed to remote branch: origin/{remote_branch}")
-                        current_branch = remote_branch
-                        break
-                    except subprocess.CalledProcessError as e:
-                        print(f"❌ Failed to create remote branch: {e}")
-                        return "", ""
-                elif response == 'n':
-                    print("\n❌ Please create a remote branch first using:")
-                    print(f"git push -u origin {current_branch}:<new-branch-name>")
-                    print("Or run this command again and choose 'y'")
+                    print(f"✅ Using existing remote branch: origin/{current_branch}")
+                break
+            elif response == '2':
+                new_branch_name = input("\033[1;32mEnter new remote branch name: \033[0m").strip()
+                if not new_branch_name:
+                    print("Branch name cannot be empty")
+                    continue
+                
+                push = subprocess.run([GIT, "push", "-u", "origin", f"{current_branch}:{new_branch_name}"])
+                if push.returncode != 0:
+                    print(f"❌ Failed to create remote branch (exit code {push.returncode})")
                     return "", ""
-                else:
-                    print("Please answer 'y' (yes) or 'n' (no)")
-
-        # Use provided base_branch or detect default branch
-        if base_branch:
-            default_branch = base_branch
-        else:
-            try:
-                default_branch = subprocess.run(
-                    ["git", "rev-parse", "--abbrev-ref", "origin/HEAD"],
-                    capture_output=True,
-                    text=True,
-                    check=True
-                ).stdout.strip().replace('origin/', '')
-            except subprocess.CalledProcessError:
-                # Fallback to common default branch names
-                for branch in ['main', 'master']:
-                    try:
-                        subprocess.run(
-                            ["git", "rev-parse", f"origin/{branch}"],
-                            capture_output=True,
-                            check=True
-                        )
-                        default_branch = branch
-                        break
-                    except subprocess.CalledProcessError:
-                        continue
-                else:
-                    print("Could not determine default branch. Using 'main'")
-                    default_branch = 'main'
-        
-        print(f"Base branch: {default_branch}")
-        
-        # Get the diff against the specified base branch
-        print("Getting diff...")
-        diff = subprocess.run(
-            ["git", "diff", f"origin/{default_branch}...origin/{current_branch}"],
-            capture_output=True,
-            text=True,
-            check=True
-        ).stdout
+                print(f"✅ Created and pushed to remote branch: origin/{new_branch_name}")
+                current_branch = new_branch_name
+                break
+    else:
+        print(f"\nRemote branch 'origin/{current_branch}' doesn't exist.")
+        response = prompt_choice(
+            "\033[1;33mWould you like to create a remote branch? (y/n): \033[0m",
+            ('y', 'n'),
+            "Please answer 'y' (yes) or 'n' (no)"
+        )
+        if response == 'n':
+            print("\n❌ Please create a remote branch first using:")
+            print(f"git push -u origin {current_branch}:<new-branch-name>")
+            print("Or run this command again and choose 'y'")
+            return "", ""
         
-        # Get commit messages against the specified base branch
-        print("Getting commit messages...")
-        commits = subprocess.run(
-            ["git", "log", f"origin/{default_branch}..origin/{current_branch}", "--pretty=format:%s"],
-            capture_output=True,
-            text=True,
-            check=True
-        ).stdout
+        new_branch_name = input("\033[1;32mEnter remote branch name (press Enter to use current branch name): \033[0m").strip()
+        remote_branch = new_branch_name if new_branch_name else current_branch
         
-        if not diff and not commits:
-            print("❌ No changes detected to create PR.")
-            print("Make sure you have:")
-            print("1. Made some changes")
-            print("2. Committed your changes")
-            print("3. Pushed your changes to remote")
+        push = subprocess.run([GIT, "push", "-u", "origin", f"{current_branch}:{remote_branch}"])
+        if push.returncode != 0:
+            print(f"❌ Failed to create remote branch (exit code {push.returncode})")
             return "", ""
-            
-        return diff, commits
-        
-    except subprocess.CalledProcessError as e:
-        print(f"Error getting branch changes: {e}")
-        print("Make sure you:")
-        print("1. Are in a git repository")
-        print("2. Have a remote named 'origin' or 'main'")
-        print("3. Have pushed your changes")
+        print(f"✅ Created and pushed to remote branch: origin/{remote_branch}")
+        current_branch = remote_branch
+
+    # Use provided base_branch or detected default branch
+    if base_branch:
+        default_branch = base_branch
+    elif branch_info.default_branch:
+        default_branch = branch_info.default_branch
+    else:
+        print("Could not determine default branch. Using 'main'")
+        default_branch = 'main'
+    
+    print(f"Base branch: {default_branch}")
+    
+    # Get the diff and commit messages against the specified base branch.
+    # The two commands are independent, so run them concurrently.
+    print("Getting diff and commit messages...")
+    log_proc = subprocess.Popen(
+        [GIT, "log", f"origin/{default_branch}..origin/{current_branch}", "--pretty=format:%s"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        env=git_read_env()
+    )
+    diff_cmd = [GIT, "diff", f"origin/{default_branch}...origin/{current_branch}"]
+    diff_proc = subprocess.Popen(
+        diff_cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding='utf-8',
+        errors='replace',
+        env=git_read_env()
+    )
+    commits, log_err = log_proc.communicate()
+    
+    if log_proc.returncode != 0 or not commits:
+        diff_proc.kill()
+        diff_proc.communicate()
+        if log_proc.returncode != 0:
+            _print_git_error(log_err)
+            return "", ""
+        # No commits ahead of the base branch means the three-dot diff is empty too
+        print("❌ No changes detected to create PR.")
+        print("Make sure you have:")
+        print("1. Made some changes")
+        print("2. Committed your changes")
+        print("3. Pushed your changes to remote")
         return "", ""
+        
+    return _iter_proc_lines(diff_proc, diff_cmd), commits
+
+async def _gen_title(client: AsyncOpenAI, model: str, diff: str, commits: str) -> str:
+    """Generate a PR title from the commit messages and the list of changed files."""
+    changed_files = "\n".join(re.findall(r'^diff --git a/\S+ b/(\S+)$', diff, re.MULTILINE))
+    
+    user_prompt = USER_PROMPT_TITLE_PREFIX + commits + "\n\nChanged files:\n" + changed_files
+    
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT_TITLE},
+        {"role": "user", "content": user_prompt}
+    ]
+    request = {"model": model, "messages": messages, "temperature": 0}
+    key = cache_key(request)
+    cached = get_cached_response(key)
+    if cached is not None:
+        return cached
+    
+    response = await client.chat.completions.create(**request)
+    title = (response.choices[0].message.content or "").strip().strip('"')
+    set_cached_response(key, title)
+    return title
+
+async def _gen_body(client: AsyncOpenAI, model: str, changes: str, commits: str, changes_label: str = "Diff") -> str:
+    """
+    Generate a PR body from the changes, printing it live as it streams in.
+    
+    The streamed output is the body preview, handle_ai_pr only shows the title after it.
+    """
+    user_prompt = USER_PROMPT_BODY_PREFIX + commits + "\n\n" + changes_label + ":\n" + changes
+    
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT_BODY},
+        {"role": "user", "content": user_prompt}
+    ]
+    request = {"model": model, "messages": messages, "temperature": 0}
+    key = cache_key(request)
+    cached = get_cached_response(key)
+    if cached is not None:
+        _write_block("\nGenerated PR Body:", "-------------------", cached, "-------------------")
+        return cached
+    
+    response = await client.chat.completions.create(**request, stream=True)
+    
+    _write_block("\nGenerated PR Body:", "-------------------")
+    chunks = []
+    async for chunk in response:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            chunks.append(delta)
+            sys.stdout.write(delta)
+            sys.stdout.flush()
+    print("\n-------------------")
+    body = "".join(chunks).strip()
+    set_cached_response(key, body)
+    return body
+
+def _pack_file_diffs(file_diffs: List[str]) -> List[str]:
+    """
+    Pack consecutive file diffs into chunks of at most FILE_DIFF_BYTE_BUDGET bytes.
+    
+    A file diff larger than the budget gets a chunk of its own, cut to the budget.
+    """
+    chunks = []
+    current = []
+    current_bytes = 0
+    for file_diff in file_diffs:
+        size = len(file_diff.encode('utf-8'))
+        if current and current_bytes + size > FILE_DIFF_BYTE_BUDGET:
+            chunks.append("".join(current))
+            current = []
+            current_bytes = 0
+        if size > FILE_DIFF_BYTE_BUDGET:
+            chunks.append(truncate_bytes(file_diff, FILE_DIFF_BYTE_BUDGET))
+            continue
+        current.append(file_diff)
+        current_bytes += size
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+async def _summarize_chunk(client: AsyncOpenAI, model: str, semaphore: asyncio.Semaphore, chunk: str) -> str:
+    """Summarize the changes made to the files in a chunk of the diff."""
+    user_prompt = USER_PROMPT_SUMMARY_PREFIX + chunk
+    
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT_SUMMARY},
+        {"role": "user", "content": user_prompt}
+    ]
+    request = {"model": model, "messages": messages, "temperature": 0}
+    key = cache_key(request)
+    summary = get_cached_response(key)
+    if summary is None:
+        async with semaphore:
+            response = await client.chat.completions.create(**request)
+        summary = (response.choices[0].message.content or "").strip()
+        set_cached_response(key, summary)
+    return summary
+
+async def _gen_pr_content(diff: str, commits: str) -> Tuple[str, str]:
+    """Run the title and body generation concurrently on a shared client."""
+    model = get_model()
+    async with get_async_client() as client:
+        if len(diff.encode('utf-8')) > MAP_REDUCE_THRESHOLD:
+            # Map: summarize chunks of files concurrently, Reduce: write the body from the summaries
+            files = split_diff_by_file(diff)
+            chunks = _pack_file_diffs(files)
+            print(f"Large diff detected, summarizing {len(files)} files in {len(chunks)} chunks...")
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_SUMMARIES)
+            summaries = await asyncio.gather(*[_summarize_chunk(client, model, semaphore, c) for c in chunks])
+            # Keep the reduce prompt within the same budget as a pruned diff
+            summaries = truncate_bytes("\n\n".join(summaries), MAX_PROMPT_DIFF_BYTES)
+            body_task = _gen_body(client, model, summaries, commits, changes_label="Per-file summaries")
+        else:
+            body_task = _gen_body(client, model, diff, commits)
+        
+        title, body = await asyncio.gather(
+            _gen_title(client, model, diff, commits),
+            body_task
+        )
+    return title, body
 
 def generate_pr_content(diff: str, commits: str) -> Tuple[str, str]:
     """
     Generate Pull Request title and body using OpenAI API.
     
+    The title and body are requested concurrently, so the total wait is
+    bounded by the slower of the two calls rather than their sum.
+    
     Args:
         diff: Git diff content
         commits: Commit messages
@@ -205,48 +441,15 @@ def generate_pr_content(diff: str, commits: str) -> Tuple[str, str]:
         Empty strings if generation fails.
     """
     
-    # Reload environment variables, incase it was changed
-    load_dotenv(override=True) 
-
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
+    if not get_api_key():
         print("Error: OPENAI_API_KEY not found in environment variables. Please set it in .env file.")
         return "", ""
     
+    # Large diffs are summarized per file, so only prune here and let the summarizer apply the budget
+    diff = prune_diff(diff, max_bytes=None, max_hunk_lines=HUNK_MAX_LINES)
+    
     try:
-        client = OpenAI(api_key=api_key) 
-        
-        user_prompt = f"""Based on the following git diff and commit messages, generate a pull request title and detailed body.
-        The body should include:
-        - A summary of changes
-        - Key modifications
-        - Any important notes
-        
-        Commits:
-        {commits}
-        
-        Diff:
-        {diff}
-        """
-        
-        system_prompt = """You are a helpful assistant specialized in creating clear 
-        and informative pull request descriptions. You must format your response exactly as:
-        TITLE: <title>
-        BODY:
-        <body>"""
-        
-        response = client.beta.chat.completions.parse(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            response_format=PRContent,
-            temperature=0  
-        )
-        
-        content = json.loads(response.choices[0].message.content)
-        return content["title"], content["body"]
+        return asyncio.run(_gen_pr_content(diff, commits))
         
     except Exception as e:
         print(f"\nError generating PR content: {str(e)}")
@@ -256,128 +459,164 @@ def generate_pr_content(diff: str, commits: str) -> Tuple[str, str]:
         print("3. You have access to the specified model")
         return "", ""
 
-def process_todos(diff: str) -> Tuple[str, list]:
-    """Process TODOs in the diff and create Linear issues."""
-    comment_prefix = r'[+-].*?(?:#|//|/\*)\s*'
-    todo_pattern = fr'{comment_prefix}TODO\s*(?:\(([^)]*)\))?\s*:\s*(.+?)(?:\s*\*/)?\s*$'
-    issue_id_pattern = r'^[A-Z]{2,}-\d+$'
+def _files_differing_from_head(file_paths: List[str]) -> Optional[List[str]]:
+    """
+    Return the files whose working tree or index content differs from HEAD.
+    
+    One git call covers all files, and git applies its own filters (e.g. line
+    endings) when comparing.
     
+    Args:
+        file_paths: Paths relative to the repository root
+    
+    Returns:
+        Optional[List[str]]: Files with uncommitted changes, None if git fails
+    """
+    # Paths are matched literally, a '*', '?' or '[' in a file name must not glob other files
+    result = run_git("--literal-pathspecs", "diff", "--name-only", "-z", "HEAD", "--", *file_paths)
+    if result.returncode != 0:
+        print(f"❌ Error checking for uncommitted changes: {result.stderr.strip()}")
+        return None
+    return [path for path in result.stdout.split('\0') if path]
+
+def _rewrite_todo_lines(file_path: str, changes: dict):
+    """
+    Replace TODO lines in a file in one streaming pass and swap it in atomically.
+    
+    Args:
+        file_path: Path of the file to update
+        changes: Mapping of stripped original line -> replacement line
+    """
+    applied = set()
+    # Write next to the original and swap it in, so an interrupted write never leaves a partial file.
+    # newline='' keeps the file's own line endings instead of translating them.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)), suffix='.tmp')
+    try:
+        with open(file_path, 'r', encoding='utf-8', newline='') as src, \
+                os.fdopen(fd, 'w', encoding='utf-8', newline='') as dst:
+            for line in src:
+                key = line.strip()
+                if key in changes:
+                    content = line.rstrip('\r\n')
+                    dst.write(changes[key] + line[len(content):])
+                    applied.add(key)
+                else:
+                    dst.write(line)
+        os.chmod(tmp_path, os.stat(file_path).st_mode & 0o7777)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    
+    # The written content is exactly what was streamed, so a line that didn't match is the only possible miss
+    for key in changes.keys() - applied:
+        print(f"⚠️ Warning: Could not find the TODO line in {file_path}, not updated: {changes[key]}")
+
+def process_todos(diff_lines: Iterable[str]) -> Tuple[str, list]:
+    """
+    Process TODOs in the diff and create Linear issues.
+    
+    Args:
+        diff_lines: Lines of the diff, including line endings. Consumed once.
+    
+    Returns:
+        Tuple[str, list]: (diff with updated TODO lines, TODOs)
+        The original diff and None for TODOs if processing failed.
+    """
+    # Scanned as one string so the walk over lines happens inside the regex engine,
+    # only file headers and lines mentioning TODO come back to Python
+    diff = ''.join(diff_lines)
     todos = []
     current_file = None
-    updated_lines = []
+    pending = []  # (span in diff, index in todos, file, line, context, comment) of TODOs needing an issue
+    edits = []  # (span in diff, replacement line), in diff order
     file_changes = {}
     linear_client = None
     
-    try:
-        linear_client = LinearClient()
-    except ValueError as e:
-        print(f"⚠️ Linear client initialization failed: {str(e)}")
-        return diff, None  # Return original diff and None for todos to trigger the confirmation prompt
-
     removed_todos = [] 
-    for line in diff.split('\n'):
-        if line.startswith('+++'):
-            current_file = line[6:]
-            if current_file.startswith('b/'):
-                current_file = current_file[2:]
-            updated_lines.append(line)
-            continue
-            
-        if line.startswith('-'):
-            todo_match = re.search(todo_pattern, line)
-            if todo_match and current_file:
-                context = todo_match.group(1)
-                if context and re.match(issue_id_pattern, context):
-                    removed_todos.append((current_file, context))
-            updated_lines.append(line)
-            continue
-
-        if not line.startswith('+'):
-            updated_lines.append(line)
+    for scan_match in _DIFF_SCAN_RE.finditer(diff):
+        if scan_match.group('file') is not None:
+            current_file = scan_match.group('file')
             continue
-            
-        todo_match = re.search(todo_pattern, line)
+        
+        line = scan_match.group('todo')
+        todo_match = _TODO_RE.match(line)
         if not todo_match or not current_file:
-            updated_lines.append(line)
             continue
-            
         context = todo_match.group(1)
+        
+        if line.startswith('-'):
+            if context and _ISSUE_ID_RE.match(context):
+                removed_todos.append((current_file, context))
+            continue
+        
         comment = todo_match.group(2).strip()
         
-        if context and re.match(issue_id_pattern, context):
+        if context and _ISSUE_ID_RE.match(context):
             todos.append((current_file, line, context, comment))
-            updated_lines.append(line)
             continue
-            
-        issue_id = linear_client.create_issue(
-            title=comment,
-            file_path=current_file,
-            context=context
-        ) if linear_client else None
         
-        if not issue_id:
-            print(f"⚠️ Linear issue creation failed")
-            return diff, None  # Return original diff and None to trigger confirmation prompt
-            
-        if issue_id:
-            indent = re.match(r'^\+\s*', line).group()
-            comment_symbol = '#' if '#' in line else '//'
-            new_line = f"{indent}{comment_symbol} TODO({issue_id}):{comment}" if context is None else f"{indent}{comment_symbol} TODO({issue_id}):({context}):({comment})"
+        # Issues are created together after the scan, the line is rewritten then
+        pending.append((scan_match.span('todo'), len(todos), current_file, line, context, comment))
+        todos.append(None)
+    
+    if pending:
+        # The rewritten files are committed as a whole, so they must not carry unrelated uncommitted changes.
+        # Checked before any issue is created so a refusal leaves nothing behind in Linear.
+        dirty_files = _files_differing_from_head(list(dict.fromkeys(file_path for _, _, file_path, _, _, _ in pending)))
+        if dirty_files is None:
+            return diff, None
+        if dirty_files:
+            print(f"❌ Uncommitted changes in {', '.join(dirty_files)}, commit or stash them to update TODOs")
+            return diff, None
+    
+    # Only connect to Linear once the scan found something to do, most diffs have no TODOs
+    if pending or removed_todos:
+        try:
+            linear_client = LinearClient()
+        except ValueError as e:
+            print(f"⚠️ Linear client initialization failed: {str(e)}")
+            return diff, None  # Return original diff and None for todos to trigger the confirmation prompt
+    
+    try:
+        if pending:
+            issue_ids = linear_client.create_issues([
+                {'title': comment, 'file_path': file_path, 'context': context}
+                for _, _, file_path, _, context, comment in pending
+            ])
+            if not all(issue_ids):
+                print(f"⚠️ Linear issue creation failed")
+                return diff, None  # Return original diff and None to trigger confirmation prompt
+        
+            for (span, todo_index, file_path, line, context, comment), issue_id in zip(pending, issue_ids):
+                indent = _INDENT_RE.match(line).group()
+                comment_symbol = '#' if '#' in line else '//'
+                new_line = f"{indent}{comment_symbol} TODO({issue_id}):{comment}" if context is None else f"{indent}{comment_symbol} TODO({issue_id}):({context}):({comment})"
             
-            if current_file not in file_changes:
-                file_changes[current_file] = []
-            file_changes[current_file].append((
-                line.lstrip('+'),
-                new_line.lstrip('+')
-            ))
+                # Keyed by the stripped source line so the file rewrite is a single lookup per line
+                file_changes.setdefault(file_path, {})[line.lstrip('+').strip()] = new_line.lstrip('+')
             
-            todos.append((current_file, new_line, issue_id, comment))
-            updated_lines.append(new_line)
-        else:
-            print(f"⚠️ Keeping original TODO line due to Linear issue creation failure")
-            todos.append((current_file, line, context, comment))
-            updated_lines.append(line)
+                todos[todo_index] = (file_path, new_line, issue_id, comment)
+                edits.append((span, new_line))
     
-    if removed_todos and linear_client:
-        print("\nProcessing removed TODOs...")
-        for file_path, issue_id in removed_todos:
-            try:
-                if linear_client.complete_issue(issue_id):
+        if removed_todos and linear_client:
+            print("\nProcessing removed TODOs...")
+            completed = linear_client.complete_issues([issue_id for _, issue_id in removed_todos])
+            for (file_path, issue_id), done in zip(removed_todos, completed):
+                if done:
                     print(f"✅ Marked Linear issue {issue_id} as done (removed from {file_path})")
                 else:
                     print(f"⚠️ Failed to mark Linear issue {issue_id} as done")
-            except Exception as e:
-                print(f"❌ Error updating Linear issue {issue_id}: {str(e)}")
+    finally:
+        # Linear isn't needed past this point, release its connections and worker threads
+        if linear_client:
+            linear_client.close()
 
     if file_changes:
         try:
             for file_path, changes in file_changes.items():
                 try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.readlines()
-                    
-                    updated_content = []
-                    for line in content:
-                        line_stripped = line.rstrip('\n')
-                        matched = False
-                        for old_line, new_line in changes:
-                            if line_stripped.strip() == old_line.strip():
-                                updated_content.append(new_line + '\n')
-                                matched = True
-                                break
-                        if not matched:
-                            updated_content.append(line)
-                    
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.writelines(updated_content)
-                    
-                    # verify changes to ensure they were applied correctly
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        verify_content = f.read()
-                        for _, new_line in changes:
-                            if new_line not in verify_content:
-                                print(f"⚠️ Warning: Failed to verify change: {new_line}") 
-                        
+                    _rewrite_todo_lines(file_path, changes)
                 except Exception as e:
                     print(f"❌ Error updating {file_path}: {str(e)}")
                     print(f"Error details: {type(e).__name__}: {str(e)}")
@@ -387,19 +626,84 @@ def process_todos(diff: str) -> Tuple[str, list]:
             total_changes = sum(len(changes) for changes in file_changes.values())
             file_list = ', '.join(file_changes.keys())
             
-            for file_path in file_changes.keys():
-                subprocess.run(["git", "add", file_path], check=True)
-                
+            # Stage every updated file with a single git call. They are tracked and were clean before the rewrite,
+            # so the index is updated directly without git add's pathspec matching.
+            subprocess.run(
+                [GIT, "update-index", "-z", "--stdin"],
+                input=''.join(file_path + '\0' for file_path in file_changes),
+                encoding='utf-8',
+                check=True
+            )
+            
             commit_msg = f"Update {total_changes} TODOs with Linear issue IDs in {file_list}"
-            subprocess.run(["git", "commit", "-m", commit_msg], check=True)
-            subprocess.run(["git", "push"], check=True)
+            subprocess.run([GIT, "commit", "-m", commit_msg], check=True)
+            subprocess.run([GIT, "push"], check=True)
             print(f"✅ Updated and committed {total_changes} TODOs across {len(file_changes)} files")
             
         except subprocess.CalledProcessError as e:
             print(f"❌ Error committing changes: {str(e)}")
             return diff, None
     
-    return '\n'.join(updated_lines), todos
+    # Splice the rewritten TODO lines into the diff, everything between them is copied once
+    parts = []
+    position = 0
+    for (start, end), new_line in edits:
+        parts.append(diff[position:start])
+        parts.append(new_line)
+        position = end
+    parts.append(diff[position:])
+    return ''.join(parts), todos
+
+def _write_block(*lines: str):
+    """Write a block of lines to stdout with a single write and flush, e.g. before a prompt."""
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+def _editor_command() -> List[str]:
+    """
+    Return the editor command the way git resolves it (GIT_EDITOR, core.editor, VISUAL, EDITOR).
+    
+    Falls back to VISUAL/EDITOR, then notepad on Windows and vi elsewhere, if git can't tell.
+    """
+    result = run_git("var", "GIT_EDITOR")
+    editor = result.stdout.strip() if result.returncode == 0 else ""
+    if not editor:
+        editor = os.environ.get('VISUAL') or os.environ.get('EDITOR') or ('notepad' if os.name == 'nt' else 'vi')
+    if os.name == 'nt':
+        # Non-POSIX splitting keeps backslashes in Windows paths, but leaves the quotes on quoted parts
+        return [arg.strip('"') for arg in shlex.split(editor, posix=False)]
+    return shlex.split(editor)
+
+def edit_pr_content(title: str, body: str) -> Tuple[str, str]:
+    """
+    Open the git editor on a temporary file seeded with the PR content.
+    
+    The first line of the saved file is the title, the rest is the body.
+    On Windows, notepad is used if the configured editor isn't installed.
+    
+    Returns:
+        Tuple[str, str]: (new title, new body), empty strings if left blank
+    """
+    with tempfile.NamedTemporaryFile('w', suffix='.md', delete=False, encoding='utf-8') as f:
+        f.write(f"{title}\n\n{body}\n")
+        path = f.name
+    
+    try:
+        editor = _editor_command()
+        try:
+            subprocess.run(editor + [path], check=True)
+        except FileNotFoundError:
+            # git defaults to vi, which Windows usually doesn't have
+            if os.name != 'nt' or editor == ['notepad']:
+                raise
+            subprocess.run(['notepad', path], check=True)
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    finally:
+        os.unlink(path)
+    
+    new_title, _, new_body = content.strip().partition('\n')
+    return new_title.strip(), new_body.strip()
 
 def handle_ai_pr(additional_args: list = None) -> int:              
     """
@@ -421,6 +725,11 @@ def handle_ai_pr(additional_args: list = None) -> int:
     print("✅ GitHub CLI check passed")
     
     try:
+        # --refresh is handled here and must not be forwarded to gh
+        refresh = bool(additional_args) and '--refresh' in additional_args
+        if refresh:
+            additional_args = [arg for arg in additional_args if arg != '--refresh']
+        
         base_branch = None
         if additional_args:
             try:
@@ -435,25 +744,25 @@ def handle_ai_pr(additional_args: list = None) -> int:
             except ValueError:
                 pass 
         
-        diff, commits = get_branch_changes(base_branch)
-        if not diff and not commits:
+        diff_lines, commits = get_branch_changes(base_branch, refresh=refresh)
+        if not commits:
             return 1
         print("✅ Got branch changes")
             
         print("\n\033[1mChecking for new TODOs...\033[0m")
-        diff, todos = process_todos(diff)
+        # Lockfiles and generated assets never reach the prompt, so don't hold them in memory either
+        diff, todos = process_todos(skip_noise_files(diff_lines))
         if todos is None:
             print("⚠️ TODO processing failed.")
-            while True:
-                response = input("\033[1;33mWould you like to continue creating PR without processing TODOs? (y/n): \033[0m").lower()
-                if response == 'n':
-                    print("❌ Aborting PR creation.")
-                    return 1
-                elif response == 'y':
-                    print("Continuing without TODO processing...")
-                    break
-                else:
-                    print("Please answer 'y' (yes) or 'n' (no)")
+            response = prompt_choice(
+                "\033[1;33mWould you like to continue creating PR without processing TODOs? (y/n): \033[0m",
+                ('y', 'n'),
+                "Please answer 'y' (yes) or 'n' (no)"
+            )
+            if response == 'n':
+                print("❌ Aborting PR creation.")
+                return 1
+            print("Continuing without TODO processing...")
         
         print("\nGenerating PR content using AI...")
         title, body = generate_pr_content(diff, commits)
@@ -462,55 +771,33 @@ def handle_ai_pr(additional_args: list = None) -> int:
             return 1
         print("✅ PR content generated")
         
-        # Show preview so user can edit if needed
-        print("\nGenerated PR Title:", title)
-        print("\nGenerated PR Body:")
-        print("-------------------")
-        print(body)
-        print("-------------------")
+        # The body was shown as it streamed in, complete the preview with the title
+        print(f"\nGenerated PR Title: {title}")
         
         while True:
-            response = input("\033[1;32m\nWould you like to create this PR? (y[es]/n[o]/e[dit]): \033[0m").lower()
+            response = prompt_choice(
+                "\033[1;32m\nWould you like to create this PR? (y[es]/n[o]/e[dit]): \033[0m",
+                ('y', 'n', 'e'),
+                "Please answer 'y' (yes), 'n' (no), or 'e' (edit)"
+            )
             
             if response == 'n':
                 print("\n\033[1;31mPR creation cancelled.\033[0m")
                 return 0
-            elif response == 'e':
-                # Allow editing
-                print("\n\033[1mEnter new title (press Enter to keep current):\033[0m")
-                new_title = input().strip()
-                
-                print("\n\033[1mEnter new body (press Enter to keep current)\033[0m")
-                print("\033[1mEnter your text (Ctrl+D or Ctrl+Z to finish):\033[0m")
-                
-                try:
-                    lines = []
-                    while True:
-                        try:
-                            line = input()
-                            lines.append(line)
-                        except EOFError: 
-                            break
-                    new_body = '\n'.join(lines)
-                except KeyboardInterrupt:  
-                    print("\n\033[1;31mEditing cancelled.\033[0m")
-                    continue
-                
-                title = new_title if new_title else title
-                body = new_body if new_body else body
-                
-                print("\n\033[1mUpdated PR content:\033[0m")
-                print(f"\nTitle: {title}")
-                print("\n\033[1mBody:\033[0m")
-                print("-------------------")
-                print(body)
-                print("-------------------")
-                continue  
-                
             elif response == 'y':
                 break
-            else:
-                print("Please answer 'y' (yes), 'n' (no), or 'e' (edit)")
+            
+            # Let the user edit title and body in their editor, the way git does for commit messages
+            try:
+                new_title, new_body = edit_pr_content(title, body)
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f"\n\033[1;31mEditing cancelled: {str(e)}\033[0m")
+                continue
+            
+            title = new_title if new_title else title
+            body = new_body if new_body else body
+            # The body was just reviewed in the editor, only echo the title back
+            print(f"\n\033[1mUpdated PR title:\033[0m {title}")
         
         if additional_args:
             filtered_args = [arg for arg in additional_args if arg not in ['pr', 'create']]
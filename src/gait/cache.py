@@ -0,0 +1,75 @@
+"""
+Local caches under ~/.cache/gait.
+Responses generated with temperature=0 are stored in a SQLite database so
+re-running the same request skips the API round-trip.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Optional
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "gait")
+CACHE_DB = os.path.join(CACHE_DIR, "responses.sqlite3")
+CACHE_TTL = 7 * 24 * 60 * 60  # 7 days
+
+def cache_key(request: dict) -> Optional[str]:
+    """
+    Build the cache key for a chat completion request.
+
+    Args:
+        request: Keyword arguments for chat.completions.create that affect the output
+            (model, messages, temperature, max_tokens, ...), without stream
+
+    Returns:
+        Optional[str]: sha256 hex digest, or None if the request must not be cached
+        (temperature not 0, the API defaults to 1, or GAIT_NO_CACHE=1).
+    """
+    if request.get("temperature", 1) > 0 or os.getenv("GAIT_NO_CACHE") == "1":
+        return None
+    payload = json.dumps(request, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(CACHE_DB)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT, ts INTEGER)"
+    )
+    return conn
+
+def get_cached_response(key: Optional[str]) -> Optional[str]:
+    """Return the cached response for key, or None if missing, expired or disabled."""
+    if key is None:
+        return None
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT response FROM responses WHERE key = ? AND ts >= ?",
+                (key, int(time.time()) - CACHE_TTL)
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+    except (sqlite3.Error, OSError):
+        # The cache is best effort, a broken cache must never block generation
+        return None
+
+def set_cached_response(key: Optional[str], response: str) -> None:
+    """Store response under key. Empty responses are not cached."""
+    if key is None or not response:
+        return
+    try:
+        conn = _connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, ts) VALUES (?, ?, ?)",
+                    (key, response, int(time.time()))
+                )
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError):
+        pass
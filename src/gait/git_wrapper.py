@@ -1,25 +1,53 @@
+import os
 import subprocess
 import sys
-from .ai_commit import handle_ai_commit
-from .ai_pr import handle_ai_pr
-from .github_wrapper import handle_pr_command
+from typing import Callable, Dict, List, Optional, Tuple
+from .utils import GIT
+
+# The AI and GitHub handlers pull in heavy SDKs, so each one imports its module when called.
+# A handler returns the exit code, or None to pass the command through to git.
+def _handle_ai_commit(command: List[str]) -> Optional[int]:
+    from .ai_commit import handle_ai_commit
+    return handle_ai_commit()
+
+def _handle_ai_pr(command: List[str]) -> Optional[int]:
+    if "create" not in command:
+        return None
+    from .ai_pr import handle_ai_pr
+    # Remove --ai flag before passing additional args
+    return handle_ai_pr([arg for arg in command if arg != "--ai"])
+
+def _handle_pr(command: List[str]) -> Optional[int]:
+    if "create" not in command:
+        return None
+    # Forward to github_wrapper
+    from .github_wrapper import handle_pr_command
+    return handle_pr_command(command)
+
+# (subcommand, whether --ai was given) -> handler
+_HANDLERS: Dict[Tuple[str, bool], Callable[[List[str]], Optional[int]]] = {
+    ("commit", True): _handle_ai_commit,
+    ("pr", True): _handle_ai_pr,
+    ("pr", False): _handle_pr,
+}
 
 def run_git_command(command):
     if len(command) >= 1:
-        if command[0] == "commit" and "--ai" in command:
-            return handle_ai_commit()
-        elif command[0] == "pr" and "create" in command:
-            if "--ai" in command:
-                # Remove --ai flag before passing additional args
-                filtered_args = [arg for arg in command if arg != "--ai"]
-                return handle_ai_pr(filtered_args)
-            else:
-                # Forward to github_wrapper
-                return handle_pr_command(command)
+        handler = _HANDLERS.get((command[0], "--ai" in command))
+        exit_code = handler(command) if handler else None
+        if exit_code is not None:
+            return exit_code
+    
+    # git command handling
+    full_command = [GIT] + command
+    if os.name != 'nt':
+        # Hand the process over to git: no Python process lingers while it runs and signals reach git directly.
+        # Windows has no real exec (the parent exits before git finishes), so it keeps the subprocess path.
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.execvp(GIT, full_command)
     
     try:
-        # git command handling
-        full_command = ["git"] + command
         result = subprocess.run(
             full_command,
             check=True,
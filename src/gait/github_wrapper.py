@@ -1,10 +1,59 @@
 # Wrapper for GitHub CLI (gh)
+import os
 import subprocess
+import time
 from typing import Tuple, Optional, List
 import sys
+from .cache import CACHE_DIR
+
+GH_HOSTS_FILE = os.path.join(
+    os.getenv("GH_CONFIG_DIR") or os.path.join(os.path.expanduser("~"), ".config", "gh"), "hosts.yml"
+)
+# A successful 'gh auth status' is trusted for this long while hosts.yml is unchanged
+GH_AUTH_STAMP = os.path.join(CACHE_DIR, "gh_auth")
+GH_AUTH_TTL = 30  # seconds
+
+_gh_auth_verified = False
+
+def _gh_auth_fingerprint() -> Optional[str]:
+    """Return the hosts.yml mtime, None if gh auth can't be cached (token from env, no hosts file)."""
+    if os.getenv("GH_TOKEN") or os.getenv("GITHUB_TOKEN"):
+        return None
+    try:
+        return str(os.stat(GH_HOSTS_FILE).st_mtime_ns)
+    except OSError:
+        return None
+
+def _gh_auth_recently_verified() -> bool:
+    fingerprint = _gh_auth_fingerprint()
+    if fingerprint is None:
+        return False
+    try:
+        if time.time() - os.path.getmtime(GH_AUTH_STAMP) > GH_AUTH_TTL:
+            return False
+        with open(GH_AUTH_STAMP, 'r', encoding='utf-8') as f:
+            return f.read() == fingerprint
+    except OSError:
+        return False
+
+def _mark_gh_auth_verified():
+    global _gh_auth_verified
+    _gh_auth_verified = True
+    fingerprint = _gh_auth_fingerprint()
+    if fingerprint is None:
+        return
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(GH_AUTH_STAMP, 'w', encoding='utf-8') as f:
+            f.write(fingerprint)
+    except OSError:
+        pass
 
 def check_gh_auth() -> Tuple[bool, str]:
     """Check if GitHub CLI is installed and authenticated"""
+    # 'gh auth status' makes a network round-trip, skip it if auth was just verified
+    if _gh_auth_verified or _gh_auth_recently_verified():
+        return True, "GitHub CLI authenticated"
     try:
         result = subprocess.run(
             ["gh", "auth", "status"], 
@@ -12,6 +61,7 @@ def check_gh_auth() -> Tuple[bool, str]:
             text=True
         )
         if result.returncode == 0:
+            _mark_gh_auth_verified()
             return True, "GitHub CLI authenticated"
         else:
             return False, f"GitHub CLI not authenticated. Error: {result.stderr}"
@@ -1,12 +1,31 @@
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
-from gql.transport.exceptions import TransportQueryError
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+import functools
+from typing import List, Optional
 import os
+import threading
+from .utils import load_env
+
+LINEAR_API_URL = 'https://api.linear.app/graphql'
+# Maximum number of issues created concurrently
+MAX_CONCURRENT_ISSUES = 8
+# Issues created by a single GraphQL request, one aliased issueCreate field each
+ISSUES_PER_REQUEST = 25
+
+# gql pulls in requests and graphql-core, so it is imported on first use rather than
+# whenever ai_pr is loaded
+@functools.lru_cache(maxsize=None)
+def gql(source: str):
+    """Parse a GraphQL document, once per distinct query string."""
+    from gql import gql as parse
+    return parse(source)
 
 class LinearClient:
     def __init__(self):
-        load_dotenv(override=True)
+        load_env()
+        self._owner_thread = threading.current_thread()
+        self._local = threading.local()
+        self._clients = []  # Clients with an open session, closed by close()
+        self._executor = None
         self._init_client()
             
     def _init_client(self):
@@ -21,56 +40,134 @@ class LinearClient:
         if not self.team_id:
             raise ValueError("Missing required Linear team ID")
             
+        self.client = self._new_client()
+        
         if not self.project_id:
             print("LINEAR_PROJECT_ID not found in environment variables")
-            transport = RequestsHTTPTransport(
-                url='https://api.linear.app/graphql',
-                headers={'Authorization': self.api_key}
-            )
-            self.client = Client(transport=transport, fetch_schema_from_transport=True)
             self.list_available_teams()
+            self.close()
             raise ValueError("Please set LINEAR_PROJECT_ID to one of the above project IDs")
-            
+    
+    def _new_client(self):
+        from gql import Client
+        from gql.transport.requests import RequestsHTTPTransport
+        # The queries are static and validated by Linear, so the schema introspection round-trip is skipped
         transport = RequestsHTTPTransport(
-            url='https://api.linear.app/graphql',
+            url=LINEAR_API_URL,
             headers={'Authorization': self.api_key}
         )
-        self.client = Client(transport=transport, fetch_schema_from_transport=True)
+        return Client(transport=transport)
+    
+    def _session(self):
+        """
+        Return the gql session for the calling thread, connecting it on first use.
+        
+        Client.execute opens and closes a new HTTP session per call, a connected
+        session keeps one so calls reuse the keep-alive connection and TLS session.
+        A gql Client can't execute concurrently, so worker threads get their own client.
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            client = self.client if threading.current_thread() is self._owner_thread else self._new_client()
+            session = client.connect_sync()
+            self._clients.append(client)
+            self._local.session = session
+        return session
+    
+    def _map(self, fn, items: list) -> list:
+        """Apply fn to items on the worker pool, keeping the order. Single items run inline."""
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_ISSUES)
+        return list(self._executor.map(fn, items))
+    
+    def close(self):
+        """Stop the worker threads and close the open HTTP sessions."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        for client in self._clients:
+            client.close_sync()
+        self._clients = []
+        self._local = threading.local()
+    
+    def create_issues(self, items: List[dict]) -> List[Optional[str]]:
+        """
+        Create several Linear issues, up to ISSUES_PER_REQUEST per request.
+        
+        Args:
+            items: Keyword arguments for create_issue, one dict per issue
+        
+        Returns:
+            List[Optional[str]]: Issue identifiers in the same order as items, None for failures
+        """
+        batches = [items[i:i + ISSUES_PER_REQUEST] for i in range(0, len(items), ISSUES_PER_REQUEST)]
+        return [issue_id for batch in self._map(self._create_issue_batch, batches) for issue_id in batch]
+    
+    def complete_issues(self, issue_ids: List[str]) -> List[bool]:
+        """
+        Mark several Linear issues as completed concurrently.
+        
+        Args:
+            issue_ids: The Linear issue IDs (e.g., 'ENG-123')
+        
+        Returns:
+            List[bool]: Success of each issue, in the same order as issue_ids
+        """
+        if len(issue_ids) <= 1:
+            return [self.complete_issue(issue_id) for issue_id in issue_ids]
+        # Resolve the shared 'Done' state once before the workers need it
+        try:
+            self._done_state_id()
+        except Exception as e:
+            print(f"Error fetching workflow states: {str(e)}")
+            return [False] * len(issue_ids)
+        return self._map(self.complete_issue, issue_ids)
     
     def create_issue(self, title: str, file_path: str = None, line_content: str = None, context: str = None) -> str:
-        # include file path and context in description to provide more context for the ticket
-        description = []
-        if file_path:
-            description.append(f"**File:** `{file_path}`")
-        if context:
-            description.append(f"**Context:** {context}")
-            
-        description = "\n\n".join(description)
-            
-        mutation = gql("""
-            mutation CreateIssue($title: String!, $teamId: String!, $projectId: String!, $description: String) {
-                issueCreate(input: {
-                    title: $title,
+        return self.create_issues([{
+            'title': title,
+            'file_path': file_path,
+            'line_content': line_content,
+            'context': context
+        }])[0]
+    
+    def _create_issue_batch(self, items: List[dict]) -> List[Optional[str]]:
+        """
+        Create issues with one request holding an aliased issueCreate per item.
+        
+        Top-level mutation fields run in order, so the issues are created as if
+        create_issue had been called for each item in turn.
+        """
+        from gql.transport.exceptions import TransportQueryError
+        declarations = ["$teamId: String!", "$projectId: String!"]
+        fields = []
+        variables = {'teamId': self.team_id, 'projectId': self.project_id}
+        for i, item in enumerate(items):
+            declarations += [f"$title{i}: String!", f"$description{i}: String"]
+            fields.append(f"""
+                i{i}: issueCreate(input: {{
+                    title: $title{i},
                     teamId: $teamId,
                     projectId: $projectId,
-                    description: $description
-                }) {
+                    description: $description{i}
+                }}) {{
                     success
-                    issue {
+                    issue {{
                         identifier
-                    }
-                }
-            }
+                    }}
+                }}""")
+            variables[f'title{i}'] = item['title']
+            variables[f'description{i}'] = self._issue_description(item.get('file_path'), item.get('context'))
+        
+        mutation = gql(f"""
+            mutation CreateIssues({', '.join(declarations)}) {{{''.join(fields)}
+            }}
         """)
         
         try:
-            result = self.client.execute(mutation, variable_values={
-                'title': title,
-                'teamId': self.team_id,
-                'projectId': self.project_id,
-                'description': description
-            })
-            return result['issueCreate']['issue']['identifier']
+            result = self._session().execute(mutation, variable_values=variables)
             
         except TransportQueryError as e:
             error_data = e.errors[0].get('extensions', {})
@@ -79,33 +176,71 @@ class LinearClient:
             print(f"❌ Error creating Linear issue: {error_type} - {error_message}")
             print(" Please check your Linear API key and team ID")
             self.list_available_teams()
-            return None
+            # A field error only nulls that field, the other issues are still created
+            result = e.data or {}
+        
+        identifiers = []
+        for i in range(len(items)):
+            issue = (result.get(f'i{i}') or {}).get('issue') or {}
+            identifiers.append(issue.get('identifier'))
+        return identifiers
+    
+    @staticmethod
+    def _issue_description(file_path: Optional[str], context: Optional[str]) -> str:
+        # include file path and context in description to provide more context for the ticket
+        parts = (f"**File:** `{file_path}`" if file_path else None,
+                 f"**Context:** {context}" if context else None)
+        return "\n\n".join(part for part in parts if part)
             
     def list_available_teams(self):
+        """
+        Print the projects of the configured team.
+        
+        Only that team's projects are fetched. If the team can't be found, every
+        team is listed instead, without projects, so LINEAR_TEAM_ID can be fixed.
+        """
+        from gql.transport.exceptions import TransportQueryError
         try:
+            query = gql("""
+                query GetTeam($id: String!) {
+                    team(id: $id) {
+                        id
+                        name
+                        projects {
+                            nodes {
+                                id
+                                name
+                            }
+                        }
+                    }
+                }
+            """)
+            try:
+                team = self._session().execute(query, variable_values={'id': self.team_id}).get('team')
+            except TransportQueryError:
+                team = None  # Linear reports an unknown team ID as an error
+            
+            if team:
+                print(f"Team ID: {team['id']}, Name: {team['name']}")
+                print("Projects:")
+                for project in team['projects']['nodes']:
+                    print(f"Project ID: {project['id']}, Name: {project['name']}")
+                return
+            
             query = gql("""
                 query {
                     teams {
                         nodes {
                             id
                             name
-                            projects {
-                                nodes {
-                                    id
-                                    name
-                                }
-                            }
                         }
                     }
                 }
             """)
-            result = self.client.execute(query)
-            print("Available teams:")
+            result = self._session().execute(query)
+            print(f"Team {self.team_id} not found. Available teams:")
             for team in result['teams']['nodes']:
                 print(f"Team ID: {team['id']}, Name: {team['name']}")
-                print("Projects:")
-                for project in team['projects']['nodes']:
-                    print(f"Project ID: {project['id']}, Name: {project['name']}")
             
         except TransportQueryError as e:
             error_data = e.errors[0].get('extensions', {})
@@ -114,6 +249,32 @@ class LinearClient:
             print(f"❌ Error listing teams and projects: {error_type} - {error_message}")
             print(" Please check your Linear API key and team ID")
 
+    def _done_state_id(self) -> Optional[str]:
+        """
+        Return the ID of the 'Done' workflow state, fetched on first use.
+        
+        Returns:
+            Optional[str]: The state ID, None if there is no 'Done' state
+        """
+        if not hasattr(self, '_done_state'):
+            query = gql("""
+                query {
+                    workflowStates {
+                        nodes {
+                            id
+                            name
+                        }
+                    }
+                }
+            """)
+            
+            # search for the 'Done' state ID because different teams may have different workflow states
+            result = self._session().execute(query)
+            states = result['workflowStates']['nodes']
+            done_state = next((state for state in states if state['name'].lower() == 'done'), None)
+            self._done_state = done_state['id'] if done_state else None
+        return self._done_state
+    
     def complete_issue(self, issue_id: str) -> bool:
         """
         Mark a Linear issue as completed.
@@ -136,28 +297,13 @@ class LinearClient:
                 }
             """)
             
-            result = self.client.execute(query, variable_values={'id': issue_id})
+            result = self._session().execute(query, variable_values={'id': issue_id})
             if not result.get('issue'):
                 print(f"Issue {issue_id} not found")
                 return False
-                        
-            query = gql("""
-                query {
-                    workflowStates {
-                        nodes {
-                            id
-                            name
-                        }
-                    }
-                }
-            """)
-            
-            # search for the 'Done' state ID because different teams may have different workflow states
-            result = self.client.execute(query)
-            states = result['workflowStates']['nodes']
-            done_state = next((state for state in states if state['name'].lower() == 'done'), None)
             
-            if not done_state:
+            done_state_id = self._done_state_id()
+            if not done_state_id:
                 print(f"Could not find 'Done' state")
                 return False
             
@@ -176,9 +322,9 @@ class LinearClient:
                 }
             """)
             
-            result = self.client.execute(mutation, variable_values={
+            result = self._session().execute(mutation, variable_values={
                 'issueId': issue_id,
-                'stateId': done_state['id']
+                'stateId': done_state_id
             })
             
             if result['issueUpdate']['success']:
@@ -1,21 +1,27 @@
-from .git_wrapper import main
-from .git_wrapper import run_git_command
-from .utils import test_openai_connection
 import sys
 
 def main():
-    if len(sys.argv) > 1:
-        git_args = sys.argv[1:] # Remove the "gait" from the command
-        if git_args[0] == 'test-api':
-            success, message = test_openai_connection()
-            print(message)
-            sys.exit(0 if success else 1)
-        else:
-            exit_code = run_git_command(git_args) # pass only the command
-            sys.exit(exit_code)
+    if len(sys.argv) <= 1:
+        # Nothing to import or reconfigure just to print the usage
+        sys.stderr.write("Usage: gait <git-command>\n")
+        raise SystemExit(1)
+    
+    # Status output uses emoji; make sure consoles with a legacy code page (e.g. cp1252 on Windows)
+    # don't fail to encode them
+    for stream in (sys.stdout, sys.stderr):
+        if hasattr(stream, 'reconfigure'):
+            stream.reconfigure(encoding='utf-8')
+    
+    git_args = sys.argv[1:] # Remove the "gait" from the command
+    if git_args[0] == 'test-api':
+        from .utils import test_openai_connection
+        success, message = test_openai_connection()
+        print(message)
+        sys.exit(0 if success else 1)
     else:
-        print("Usage: gait <git-command>")
-        sys.exit(1)
+        from .git_wrapper import run_git_command
+        exit_code = run_git_command(git_args) # pass only the command
+        sys.exit(exit_code)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,43 @@
+"""
+Shared OpenAI client setup for the AI commands.
+The sync client is created lazily on first use, then reused by every caller.
+Clients talk HTTP/2 over a pooled connection so repeated requests reuse one
+TLS session.
+"""
+import functools
+import os
+from typing import Optional
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from .utils import load_env
+
+DEFAULT_MODEL = "gpt-4o-mini"
+HTTP_TIMEOUT = 60.0
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=8, max_connections=16)
+
+def get_api_key() -> Optional[str]:
+    """Return the OpenAI API key from the environment or .env file."""
+    load_env()
+    return os.getenv("OPENAI_API_KEY")
+
+@functools.lru_cache(maxsize=1)
+def get_model() -> str:
+    """Return the model set in OPENAI_MODEL, or DEFAULT_MODEL."""
+    load_env()
+    return os.getenv("OPENAI_MODEL", DEFAULT_MODEL)
+
+@functools.lru_cache(maxsize=1)
+def get_client() -> OpenAI:
+    """Return the process-wide OpenAI client."""
+    http_client = httpx.Client(http2=True, timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+    return OpenAI(api_key=get_api_key(), http_client=http_client)
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    Return a new AsyncOpenAI client.
+
+    Async clients are bound to the event loop they are used on, so one is
+    created per asyncio.run rather than cached.
+    """
+    http_client = httpx.AsyncClient(http2=True, timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+    return AsyncOpenAI(api_key=get_api_key(), http_client=http_client)
@@ -1,24 +1,76 @@
-from openai import OpenAI
-from openai import AuthenticationError, APIConnectionError
-from dotenv import load_dotenv
+from typing import Collection, Iterable, Iterator, List, Optional
 import os
+import re
+import shutil
+import subprocess
+
+# Resolved once so every git call skips the PATH search
+GIT = shutil.which("git") or "git"
+
+# OpenAI won't accept much more than this, so there is no point reading a larger diff
+MAX_DIFF_BYTES = 128 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+# Diff size sent to the model after pruning
+MAX_PROMPT_DIFF_BYTES = 100 * 1024
+
+# Files whose diffs are noise for the model: lockfiles, minified assets and binaries
+_NOISE_FILE_RE = re.compile(
+    r'(\.lock|\.min\.js|\.min\.css|\.svg|\.png|\.jpe?g|\.gif|\.ico)$'
+    r'|(^|/)(package-lock\.json|yarn\.lock|pnpm-lock\.yaml)$'
+)
+# Lines worth keeping from a file diff: headers, hunk markers and changed lines
+_KEPT_LINE_PREFIXES = ('diff --git', 'new file', 'deleted file', 'rename ', '@@', '+', '-')
+_FILE_SPLIT_RE = re.compile(r'^(?=diff --git )', re.MULTILINE)
+
+_env_loaded = False
+
+def load_env() -> None:
+    """Load variables from .env, only on the first call in the process."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv(override=True)
+        _env_loaded = True
+
+def prompt_choice(message: str, choices: Collection[str], retry_message: str) -> str:
+    """
+    Ask the user until the answer is one of choices.
+    
+    Args:
+        message: Prompt shown to the user
+        choices: Accepted answers, lowercase
+        retry_message: Printed after an answer that isn't accepted
+    
+    Returns:
+        str: The accepted answer, lowercased and stripped
+    """
+    try:
+        import readline  # noqa: F401 - gives input() line editing and history where available
+    except ImportError:
+        pass
+    while True:
+        response = input(message).strip().lower()
+        if response in choices:
+            return response
+        print(retry_message)
 
 def test_openai_connection():
+    # Imported here so plain git commands don't pay for loading the OpenAI SDK
+    from openai import APIConnectionError, AuthenticationError, NotFoundError
+    from .openai_client import get_api_key, get_client, get_model
+    
     try:
-        load_dotenv(override=True)  # Force reload environment variables
-        
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
+        if not get_api_key():
             return False, "\033[1;31mAPI key not found in environment variables\033[0m. Set it in .env file."
         
-        # Create a fresh client with the new key
-        client = OpenAI(api_key=api_key)
+        # Fetching the configured model authenticates like listing all models, with a
+        # much smaller response, and also checks the key can use that model
+        model = get_model()
+        get_client().models.retrieve(model)
         
-        # Test the connection with a minimal API call
-        models = client.models.list()  # Store the result to ensure the call completes
-        
-        model = os.getenv("OPENAI_MODEL")
         return True, f"API connection successful! Using model: {model}"
+    except NotFoundError:
+        return False, f"\033[1;31mModel not available\033[0m: {model} isn't accessible with this API key"
     except AuthenticationError as e:
         return False, f"\033[1;31mAuthentication failed\033[0m: {str(e)}"
     except APIConnectionError as e:
@@ -26,3 +78,132 @@ def test_openai_connection():
     except Exception as e:
         return False, f"\033[1;31mAn unexpected error occurred\033[0m: {str(e)}"
 
+def git_read_env() -> dict:
+    """
+    Return the environment for read-only git calls, without optional locks (e.g. to refresh the index).
+    
+    Built per call rather than at import, so variables loaded from .env are passed on.
+    """
+    return dict(os.environ, GIT_OPTIONAL_LOCKS="0")
+
+def run_git(*args: str) -> subprocess.CompletedProcess:
+    """Run a read-only git command and capture its output as text."""
+    return subprocess.run([GIT, *args], capture_output=True, text=True, env=git_read_env())
+
+def read_capped(cmd: List[str], max_bytes: Optional[int] = MAX_DIFF_BYTES,
+                env: Optional[dict] = None) -> subprocess.CompletedProcess:
+    """
+    Run a command and read its stdout incrementally, stopping after max_bytes.
+    
+    Output is accumulated as bytes and decoded once at the end. When the cap is
+    reached the process is terminated instead of being left blocked on a full pipe.
+    
+    Args:
+        cmd: Command to run
+        max_bytes: Maximum number of bytes to read, None to read everything
+        env: Environment for the command, None to inherit it
+    
+    Returns:
+        subprocess.CompletedProcess: With decoded (possibly truncated) stdout and stderr,
+        and a truncated attribute telling whether the cap was reached. returncode is 0
+        when the process was stopped because of the cap.
+    """
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    buf = bytearray()
+    truncated = False
+    while True:
+        chunk = proc.stdout.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        buf += chunk
+        if max_bytes is not None and len(buf) >= max_bytes:
+            del buf[max_bytes:]
+            truncated = True
+            proc.terminate()
+            break
+    proc.stdout.close()
+    stderr = proc.stderr.read()
+    proc.stderr.close()
+    proc.wait()
+    
+    returncode = 0 if truncated else proc.returncode
+    result = subprocess.CompletedProcess(
+        cmd, returncode, bytes(buf).decode('utf-8', 'replace'), stderr.decode('utf-8', 'replace')
+    )
+    result.truncated = truncated
+    return result
+
+def split_diff_by_file(diff: str) -> List[str]:
+    """Split a unified diff into one chunk per file, on 'diff --git' boundaries."""
+    return [chunk for chunk in _FILE_SPLIT_RE.split(diff) if chunk.strip()]
+
+def skip_noise_files(diff_lines: Iterable[str]) -> Iterator[str]:
+    """
+    Yield the lines of a streamed diff, leaving out the files prune_diff drops.
+    
+    Lockfiles and generated assets are often the largest part of a diff, so
+    dropping them while streaming keeps them from ever being held in memory.
+    """
+    skipping = False
+    for line in diff_lines:
+        if line.startswith('diff --git '):
+            file_path = line.rstrip('\n').split(' b/', 1)[-1]
+            skipping = bool(_NOISE_FILE_RE.search(file_path))
+        if not skipping:
+            yield line
+
+def prune_diff(diff: str, max_bytes: Optional[int] = MAX_PROMPT_DIFF_BYTES,
+               max_hunk_lines: Optional[int] = None) -> str:
+    """
+    Strip a unified diff down to what the model needs before it is sent to OpenAI.
+    
+    Drops files matching lockfile/minified/binary patterns, removes unchanged
+    context lines and index metadata, optionally keeps only the first changed
+    lines of each hunk, and truncates the result to max_bytes.
+    
+    Args:
+        diff: Unified diff
+        max_bytes: Maximum size of the result, None for no limit
+        max_hunk_lines: Maximum changed lines kept per hunk, None for no limit
+    
+    Returns:
+        str: The pruned diff, ending with a '[truncated]' marker if it was cut
+    """
+    pruned = []
+    for file_diff in split_diff_by_file(diff):
+        header = file_diff.split('\n', 1)[0]
+        file_path = header.split(' b/', 1)[-1]
+        if _NOISE_FILE_RE.search(file_path):
+            continue
+        
+        in_hunk = False
+        hunk_lines = omitted = 0
+        for line in file_diff.splitlines():
+            if line.startswith('@@'):
+                if omitted:
+                    pruned.append(f"[... {omitted} more changed lines]")
+                in_hunk = True
+                hunk_lines = omitted = 0
+            elif not line.startswith(_KEPT_LINE_PREFIXES):
+                continue
+            elif in_hunk and max_hunk_lines is not None:
+                # Inside a hunk only changed lines are left at this point
+                hunk_lines += 1
+                if hunk_lines > max_hunk_lines:
+                    omitted += 1
+                    continue
+            pruned.append(line)
+        if omitted:
+            pruned.append(f"[... {omitted} more changed lines]")
+    
+    result = '\n'.join(pruned)
+    if max_bytes is not None:
+        result = truncate_bytes(result, max_bytes)
+    return result
+
+def truncate_bytes(text: str, max_bytes: int) -> str:
+    """Cut text to at most max_bytes of UTF-8, adding a '[truncated]' marker if it was cut."""
+    encoded = text.encode('utf-8')
+    if len(encoded) <= max_bytes:
+        return text
+    return encoded[:max_bytes].decode('utf-8', 'ignore') + '\n[truncated]'